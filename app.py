@@ -1,34 +1,144 @@
 import os
+import re
 import sys
+import json
+import base64
+import hashlib
+import queue
 import asyncio
-from flask import Flask, render_template, request, jsonify, send_file
-from faster_whisper import WhisperModel
+import tempfile
+import threading
+from types import MappingProxyType
+from functools import lru_cache
+from itertools import chain
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from flask import Flask, Request, Response, render_template, request, jsonify, session, url_for
+from flask_compress import Compress
+from flask_cors import CORS
+from cryptography.fernet import Fernet, InvalidToken
+from faster_whisper import WhisperModel, decode_audio, download_model
 from deep_translator import GoogleTranslator
 import edge_tts
+import ctranslate2
+
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    uvloop = None
 
 # Windows asyncio fix
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
+# Werkzeug spills uploads over 500 KB to disk; voice clips are a few MB at
+# most, so keep anything up to 4 MB in memory and hand it to PyAV directly.
+UPLOAD_SPOOL_SIZE = 4 << 20
+
+class SpooledRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE, mode="rb+")
+
 app = Flask(__name__)
+app.request_class = SpooledRequest
+
+# Compress JSON/HTML (Indic scripts shrink a lot); MP3 is already compressed
+app.config["COMPRESS_MIMETYPES"] = ["application/json", "text/html"]
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_BR_LEVEL"] = 4
+Compress(app)
+
+# One app-wide CORS layer, off unless CORS_ORIGINS lists the allowed
+# origins (the bundled UI is same-origin); browsers cache the preflight
+# for a day. Credentials stay disabled: audio URLs carry their own token,
+# so cross-origin clients can play them without the session cookie, which
+# only holds the optional transcript prompt.
+CORS_ORIGINS = [origin.strip() for origin in os.environ.get("CORS_ORIGINS", "").split(",") if origin.strip()]
+if CORS_ORIGINS:
+    CORS(app, origins=CORS_ORIGINS, max_age=86400)
+app.secret_key = os.environ.get("SECRET_KEY") or os.urandom(32)
 
-RECORD_FOLDER = "record_videos"
-SPEAK_FOLDER = "speaking_video"
+# Each audio URL carries its text and voice as an encrypted, expiring
+# token: /stream_audio needs no cookie or server-side state (so it works on
+# any worker and from CORS clients), access logs only see ciphertext, and
+# the route can't be used to synthesize arbitrary text.
+_secret = app.secret_key if isinstance(app.secret_key, bytes) else app.secret_key.encode()
+audio_tokens = Fernet(base64.urlsafe_b64encode(hashlib.sha256(b"stream-audio:" + _secret).digest()))
+AUDIO_TOKEN_TTL = 3600  # seconds
 
-os.makedirs(RECORD_FOLDER, exist_ok=True)
-os.makedirs(SPEAK_FOLDER, exist_ok=True)
+# Long translations are spoken as several clips, split at sentence (or
+# else word) boundaries, so every token stays well inside gunicorn's
+# 4 KB request line.
+TTS_CHUNK_CHARS = 400
 
 # -------------------------
 # Load Whisper model
 # -------------------------
-print("Loading Whisper model...")
-model = WhisperModel("base", device="auto", compute_type="auto")
-print("Model Loaded Successfully")
+# "tiny" keeps short interactive clips fast; requests that send
+# quality=high get the larger WHISPER_HQ_SIZE model, loaded up front so
+# switching costs nothing at request time.
+WHISPER_SIZE = os.environ.get("WHISPER_SIZE", "tiny")
+WHISPER_HQ_SIZE = os.environ.get("WHISPER_HQ_SIZE", "base")
+
+# Probing CUDA initializes it, which must not happen before gunicorn forks,
+# so the device is only resolved when a worker loads its models.
+def whisper_device():
+    device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    # INT8 weights halve the memory traffic of the CPU matmuls, while GPUs
+    # run float16 on their Tensor Cores (Turing and newer) faster than INT8.
+    # WHISPER_COMPUTE_TYPE overrides either choice.
+    compute_type = os.environ.get(
+        "WHISPER_COMPUTE_TYPE",
+        "int8" if device == "cpu" else "float16",
+    )
+    return device, compute_type
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        return os.cpu_count() or 1
+
+def load_whisper(size, device, compute_type, cpu_threads):
+    return WhisperModel(
+        size,
+        device=device,
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+        num_workers=1,
+    )
+
+# Fetch the model files at import time, i.e. once in the gunicorn master
+# under preload_app, so workers load from the local cache instead of each
+# hitting the Hugging Face Hub. The weights themselves can't be shared:
+# CTranslate2 copies them into its own buffers (there is no mmap loading)
+# and its models must be created after fork.
+def resolve_model(size):
+    return size if os.path.isdir(size) else download_model(size)
+
+WHISPER_PATH = resolve_model(WHISPER_SIZE)
+WHISPER_HQ_PATH = resolve_model(WHISPER_HQ_SIZE)
+
+model = hq_model = None
+
+# -------------------------
+# Lookup tables, built once and frozen. Missing keys fall back via
+# __missing__, so request handlers just index them.
+# -------------------------
+DEFAULT_VOICE = "en-US-AriaNeural"
+
+class LanguageNames(dict):
+    def __missing__(self, code):
+        return code.upper()
+
+class VoiceMap(dict):
+    def __missing__(self, code):
+        return DEFAULT_VOICE
 
 # -------------------------
 # Language name mapping (code -> display name)
 # -------------------------
-LANGUAGE_NAMES = {
+LANGUAGE_NAMES = MappingProxyType(LanguageNames({
     "en": "English", "hi": "Hindi", "te": "Telugu", "ta": "Tamil",
     "kn": "Kannada", "ml": "Malayalam", "mr": "Marathi", "bn": "Bengali",
     "gu": "Gujarati", "pa": "Punjabi", "ur": "Urdu", "or": "Odia",
@@ -37,13 +147,13 @@ LANGUAGE_NAMES = {
     "pt": "Portuguese", "ru": "Russian", "ar": "Arabic", "tr": "Turkish",
     "nl": "Dutch", "pl": "Polish", "sv": "Swedish", "fi": "Finnish",
     "id": "Indonesian", "vi": "Vietnamese", "th": "Thai",
-}
+}))
 
 # -------------------------
 # Voice Mapping (lang code -> Edge TTS voice)
 # -------------------------
-VOICE_MAP = {
-    "en": "en-US-AriaNeural",
+VOICE_MAP = MappingProxyType(VoiceMap({
+    "en": DEFAULT_VOICE,
     "hi": "hi-IN-SwaraNeural",
     "te": "te-IN-ShrutiNeural",
     "ta": "ta-IN-PallaviNeural",
@@ -74,24 +184,223 @@ VOICE_MAP = {
     "id": "id-ID-GadisNeural",
     "vi": "vi-VN-HoaiMyNeural",
     "th": "th-TH-PremwadeeNeural",
-}
+}))
 
 # -------------------------
 # Speech to Text (Whisper auto-detects language)
 # -------------------------
-def speech_to_text(audio_path):
-    segments, info = model.transcribe(audio_path)
-    full_text = " ".join(segment.text for segment in segments)
+SAMPLE_RATE = 16000
+
+# Clips are short, discrete recordings, so greedy decoding without
+# timestamps, VAD or cross-window conditioning is enough. quality=high
+# requests keep beam search; WHISPER_QUALITY=high forces it for every
+# request (useful when benchmarking).
+FAST_DECODE_OPTIONS = {
+    "beam_size": 1,
+    "best_of": 1,
+    "without_timestamps": True,
+    "condition_on_previous_text": False,
+    "vad_filter": False,
+}
+HQ_DECODE_OPTIONS = {"beam_size": 5}
+ALWAYS_HIGH_QUALITY = os.environ.get("WHISPER_QUALITY") == "high"
+
+def speech_to_text(audio, high_quality=False, on_segment=None, initial_prompt=None, task="transcribe"):
+    """Transcribe audio; on_segment(text, language) sees each segment as it decodes."""
+    whisper = hq_model if high_quality else model
+    options = HQ_DECODE_OPTIONS if high_quality or ALWAYS_HIGH_QUALITY else FAST_DECODE_OPTIONS
+    segments, info = whisper.transcribe(audio, task=task, initial_prompt=initial_prompt, **options)
+    # Whisper segment texts carry their own leading space
+    parts = []
+    append = parts.append
+    for segment in segments:
+        append(segment.text)
+        if on_segment is not None:
+            on_segment(segment.text, info.language)
+    full_text = "".join(parts).strip()
     detected_lang = info.language  # e.g. "en", "hi", "te" etc.
     confidence = round(info.language_probability * 100, 1)
-    return full_text.strip(), detected_lang, confidence
+    return full_text, detected_lang, confidence
+
+# The previous transcript of a session (kept in the signed session cookie)
+# primes the next clip's decoder. Whisper only uses the last ~224 prompt
+# tokens, so the tail of the text is enough.
+PROMPT_MAX_CHARS = 200
+
+# Opt-in: for English targets, WHISPER_EN_TRANSLATE=1 lets Whisper's own
+# translate task replace the Google Translate round trip. Off by default,
+# since it costs the source transcript and small models translate poorly.
+WHISPER_EN_TRANSLATE = os.environ.get("WHISPER_EN_TRANSLATE", "0") == "1"
+
+# -------------------------
+# Transcription worker
+# -------------------------
+# Flask serves requests on several threads; each Whisper model runs on its
+# own worker thread fed by a queue, so clips don't contend inside
+# CTranslate2 while a slow quality=high job never holds up the fast model.
+# Keyed by high_quality.
+transcribe_queues = {}
+
+def transcribe_worker(jobs):
+    while True:
+        future, args = jobs.get()
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            future.set_result(speech_to_text(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+def transcribe(audio, high_quality=False, on_segment=None, initial_prompt=None, task="transcribe"):
+    future = Future()
+    transcribe_queues[high_quality].put((future, (audio, high_quality, on_segment, initial_prompt, task)))
+    return future.result()
+
+# -------------------------
+# Per-process workers
+# -------------------------
+# Threads, event loops and CTranslate2 models don't survive fork(), so
+# each process starts its own: gunicorn workers from the post_fork hook,
+# anything else on its first request.
+workers_pid = None
+workers_lock = threading.Lock()
+tts_loop = None
+translate_pool = None
+
+def start_workers():
+    global workers_pid, tts_loop, translate_pool, transcribe_queues, model, hq_model
+    with workers_lock:
+        if workers_pid == os.getpid():
+            return
+
+        # Background event loop for Edge TTS (shared by all requests)
+        tts_loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+        threading.Thread(target=tts_loop.run_forever, name="tts-loop", daemon=True).start()
+
+        # Translates segments while Whisper is still decoding later ones
+        translate_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="translate")
+
+        print("Loading Whisper model...")
+        device, compute_type = whisper_device()
+        # gunicorn.conf.py gives each worker its share of the cores via
+        # OMP_NUM_THREADS. Both models can decode at once (one worker thread
+        # each), so a second model splits that share instead of doubling it.
+        cpu_threads = int(os.environ.get("OMP_NUM_THREADS", 0)) or available_cpus()
+        if WHISPER_HQ_PATH == WHISPER_PATH:
+            model = hq_model = load_whisper(WHISPER_PATH, device, compute_type, cpu_threads)
+        else:
+            fast_threads = max(1, cpu_threads // 2)
+            model = load_whisper(WHISPER_PATH, device, compute_type, fast_threads)
+            hq_model = load_whisper(WHISPER_HQ_PATH, device, compute_type,
+                                    max(1, cpu_threads - fast_threads))
+        print("Model Loaded Successfully")
+
+        # Warm up both models so the first request doesn't pay for allocator setup
+        for whisper in {model, hq_model}:
+            list(whisper.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32))[0])
+
+        fast_jobs = queue.Queue()
+        hq_jobs = fast_jobs if hq_model is model else queue.Queue()
+        transcribe_queues = {False: fast_jobs, True: hq_jobs}
+        for jobs in {fast_jobs, hq_jobs}:
+            threading.Thread(target=transcribe_worker, args=(jobs,), name="transcribe", daemon=True).start()
+        workers_pid = os.getpid()
+
+@app.before_request
+def ensure_workers():
+    if workers_pid != os.getpid():
+        start_workers()
+
+# -------------------------
+# Translation (cached: demos repeat the same short phrases a lot)
+# -------------------------
+TRANSLATION_CACHE_MAX_CHARS = 512
+
+# GoogleTranslator.translate() keeps the query on the instance, so
+# translators are reused per (thread, language pair) rather than shared.
+translators = threading.local()
+
+def get_translator(source, target):
+    try:
+        by_pair = translators.by_pair
+    except AttributeError:
+        by_pair = translators.by_pair = {}
+    translator = by_pair.get((source, target))
+    if translator is None:
+        translator = by_pair[source, target] = GoogleTranslator(source=source, target=target)
+    return translator
+
+@lru_cache(maxsize=4096)
+def cached_translate(source, target, text):
+    return get_translator(source, target).translate(text)
+
+def lookup_translation(text, source, target):
+    if len(text) < TRANSLATION_CACHE_MAX_CHARS:
+        return cached_translate(source, target, text)
+    return get_translator(source, target).translate(text)
+
+# Segments are only sent for translation once they end a sentence, since
+# Whisper windows can cut mid-sentence and translating fragments loses context.
+SENTENCE_END = re.compile(r"[.!?…।॥。！？؟][\"'”’)\]]*$")
+
+# Scripts written without spaces between sentences
+UNSPACED_LANGS = frozenset({"ja", "zh", "th"})
+
+def join_sentences(sentences, lang):
+    return ("" if lang in UNSPACED_LANGS else " ").join(sentences)
 
 # -------------------------
 # Text to Speech
 # -------------------------
-async def text_to_audio(text, voice, output_path):
-    tts = edge_tts.Communicate(text, voice=voice)
-    await tts.save(output_path)
+# A sentence with its closing punctuation and trailing whitespace
+SENTENCE = re.compile(r"[^.!?…।॥。！？؟]*(?:[.!?…।॥。！？؟]+[\"'”’)\]]*\s*|$)")
+
+def split_for_tts(text):
+    """Split text into pieces of at most TTS_CHUNK_CHARS, cutting between sentences where possible."""
+    pieces = [""]
+    for sentence in SENTENCE.findall(text):
+        while len(sentence) > TTS_CHUNK_CHARS:
+            cut = sentence.rfind(" ", 0, TTS_CHUNK_CHARS)
+            if cut <= 0:
+                cut = TTS_CHUNK_CHARS
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        if len(pieces[-1]) + len(sentence) > TTS_CHUNK_CHARS:
+            pieces.append(sentence)
+        else:
+            pieces[-1] += sentence
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+def audio_url(text, voice):
+    token = audio_tokens.encrypt(json.dumps([text, voice]).encode()).decode()
+    return url_for("stream_audio", token=token)
+
+def translate(text, source, target):
+    try:
+        return lookup_translation(text, source, target)
+    except Exception:
+        # Fallback: use 'auto' if detected lang code not supported by GoogleTranslator
+        return lookup_translation(text, "auto", target)
+
+def stream_tts(text, voice):
+    """Yield MP3 chunks from Edge TTS as soon as they arrive on tts_loop."""
+    chunks = queue.Queue()
+
+    async def produce():
+        try:
+            async for chunk in edge_tts.Communicate(text, voice=voice).stream():
+                if chunk["type"] == "audio":
+                    chunks.put(chunk["data"])
+        finally:
+            chunks.put(None)
+
+    future = asyncio.run_coroutine_threadsafe(produce(), tts_loop)
+    try:
+        while (data := chunks.get()) is not None:
+            yield data
+        future.result()
+    finally:
+        future.cancel()
 
 # -------------------------
 # Routes
@@ -100,53 +409,74 @@ async def text_to_audio(text, voice, output_path):
 def index():
     return render_template("index.html")
 
-@app.route("/process_audio", methods=["POST", "OPTIONS"])
+@app.route("/process_audio", methods=["POST"])
 def process_audio():
-    if request.method == "OPTIONS":
-        return "", 204
-
     try:
         if "audio" not in request.files:
             return jsonify({"error": "No audio file provided."}), 400
 
         audio_file = request.files["audio"]
         target_lang = request.form.get("target_lang", "en")
+        high_quality = request.form.get("quality") == "high"
+
+        # 1. Auto-detect language + Transcribe (decoded from memory, never saved).
+        #    Decoding to 16 kHz mono float32 happens here on the request thread,
+        #    overlapping other clips' inference rather than inside a model worker.
+        audio = decode_audio(audio_file.stream, sampling_rate=SAMPLE_RATE)
+        if not audio.size:
+            return jsonify({"error": "No speech detected. Please speak clearly and try again."}), 400
 
-        input_path = os.path.join(RECORD_FOLDER, "record.wav")
-        output_path = os.path.join(SPEAK_FOLDER, "output.mp3")
+        # 2. Translate each sentence as soon as Whisper finishes it, or let
+        #    Whisper translate to English in the same decoding pass
+        task = "translate" if target_lang == "en" and WHISPER_EN_TRANSLATE else "transcribe"
+        pending = []
+        sentence = []
 
-        audio_file.save(input_path)
+        def submit_sentence(language):
+            sentence_text = "".join(sentence).strip()
+            sentence.clear()
+            if sentence_text:
+                pending.append(translate_pool.submit(translate, sentence_text, language, target_lang))
 
-        # 1. Auto-detect language + Transcribe
-        text, detected_lang, confidence = speech_to_text(input_path)
+        def on_segment(segment_text, language):
+            if language == target_lang:
+                return
+            sentence.append(segment_text)
+            if SENTENCE_END.search(segment_text.rstrip()):
+                submit_sentence(language)
+
+        prompt_key = f"last_{task}"
+        text, detected_lang, confidence = transcribe(
+            audio,
+            high_quality,
+            on_segment if task == "transcribe" else None,
+            session.get(prompt_key),
+            task,
+        )
         if not text:
             return jsonify({"error": "No speech detected. Please speak clearly and try again."}), 400
 
-        detected_lang_name = LANGUAGE_NAMES.get(detected_lang, detected_lang.upper())
-        target_lang_name   = LANGUAGE_NAMES.get(target_lang, target_lang.upper())
+        session[prompt_key] = text[-PROMPT_MAX_CHARS:]
+
+        detected_lang_name = LANGUAGE_NAMES[detected_lang]
+        target_lang_name   = LANGUAGE_NAMES[target_lang]
 
-        # 2. Skip translation if source == target
-        if detected_lang == target_lang:
+        # Translation is skipped if source == target
+        if detected_lang == target_lang or task == "translate":
             translated_text = text
         else:
-            try:
-                translated_text = GoogleTranslator(source=detected_lang, target=target_lang).translate(text)
-            except Exception:
-                # Fallback: use 'auto' if detected lang code not supported by GoogleTranslator
-                translated_text = GoogleTranslator(source="auto", target=target_lang).translate(text)
+            submit_sentence(detected_lang)  # whatever trailed the last sentence end
+            translated_text = join_sentences((future.result() for future in pending), target_lang)
 
-        # 3. Pick TTS voice (fallback to English if not mapped)
-        selected_voice = VOICE_MAP.get(target_lang, "en-US-AriaNeural")
+        # Whisper's translate task never produces the source-language text
+        if task == "translate" and detected_lang != "en":
+            text = None
 
-        # 4. Generate Audio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(text_to_audio(translated_text, selected_voice, output_path))
-        loop.close()
+        # 3. Pick TTS voice (fallback to English if not mapped)
+        selected_voice = VOICE_MAP[target_lang]
 
-        # 5. Delete input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
+        # 4. Audio is synthesized lazily, streamed by /stream_audio
+        audio_urls = [audio_url(piece, selected_voice) for piece in split_for_tts(translated_text)]
 
         return jsonify({
             "detected_lang":      detected_lang,
@@ -155,31 +485,40 @@ def process_audio():
             "target_lang_name":   target_lang_name,
             "original_text":      text,
             "translated_text":    translated_text,
-            "audio_url":          "/get_audio"
+            "audio_urls":         audio_urls
         })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/get_audio", methods=["GET", "OPTIONS"])
-def get_audio():
-    if request.method == "OPTIONS":
-        return "", 204
-
-    output_path = os.path.join(SPEAK_FOLDER, "output.mp3")
-    if not os.path.exists(output_path):
+@app.route("/stream_audio/<token>")
+def stream_audio(token):
+    try:
+        text, voice = json.loads(audio_tokens.decrypt(token.encode(), ttl=AUDIO_TOKEN_TTL))
+    except InvalidToken:
         return jsonify({"error": "Audio not found."}), 404
 
-    response = send_file(output_path, mimetype="audio/mpeg")
-
-    @response.call_on_close
-    def cleanup():
-        if os.path.exists(output_path):
-            os.remove(output_path)
+    # Nothing is stored, so every GET (replay, range probe) synthesizes the
+    # audio again. Pull the first chunk before answering so Edge TTS
+    # failures still surface as an error instead of a truncated 200.
+    chunks = stream_tts(text, voice)
+    try:
+        first = next(chunks)
+    except StopIteration:
+        return jsonify({"error": "Text-to-speech returned no audio."}), 502
+    except Exception as e:
+        return jsonify({"error": f"Text-to-speech failed: {e}"}), 502
 
-    return response
+    # Synthesized on the fly: no file to stat for ETag/Last-Modified, and
+    # nothing worth keeping in intermediary caches
+    return Response(
+        chain([first], chunks),
+        mimetype="audio/mpeg",
+        headers={"Cache-Control": "no-store"},
+    )
 
 
 if __name__ == "__main__":
+    start_workers()
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 10000)))
\ No newline at end of file
@@ -0,0 +1,39 @@
+# Gunicorn settings, picked up automatically when run from the project root:
+#   gunicorn wsgi:app
+import os
+
+
+def available_cpus():
+    """CPUs this process may run on, honouring affinity and cpuset limits like nproc."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+# Every worker loads its own Whisper models (tiny + base by default), so
+# memory grows with the worker count: stay at one unless WEB_CONCURRENCY
+# says the host can afford more.
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+reuse_port = True
+
+# Import the app once in the master; workers fork from it.
+preload_app = True
+
+# Loading Whisper in a fresh worker can take a while
+timeout = 120
+
+
+def post_fork(server, worker):
+    # Split the cores between the workers actually running (-w on the
+    # command line overrides the value above) so CTranslate2 doesn't
+    # oversubscribe them; app.load_whisper reads this.
+    os.environ.setdefault(
+        "OMP_NUM_THREADS", str(max(1, available_cpus() // server.cfg.workers))
+    )
+
+    from app import start_workers
+    start_workers()